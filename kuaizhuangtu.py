@@ -1,10 +1,18 @@
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+from matplotlib.collections import PatchCollection
 import numpy as np
-import random
-from matplotlib.colors import hsv_to_rgb
 import math
 
+# 生成随机颜色使用的随机数生成器
+_RNG = np.random.default_rng()
+
+# 计算颜色亮度时RGB三个通道的权重
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])
+
+# 矩形数量达到该值时才用numba编译布局算法（编译耗时远超小规模输入的计算时间）
+_NUMBA_MIN_SIZE = 2000000
+
 
 def draw_rectangles_by_ratio(ratios, labels=None, image_size=6, dpi=100):
     """
@@ -15,9 +23,14 @@ def draw_rectangles_by_ratio(ratios, labels=None, image_size=6, dpi=100):
     labels: 列表，包含各个小矩形的标识文本（可选，默认为比例值）
     image_size: 正方形图片的大小（英寸）
     dpi: 图片的分辨率
+
+    返回:
+    (fig, ax, rectangles)，其中 rectangles 为 layout_rectangles_exact 计算出的矩形列表
     """
+    ratios = np.asarray(ratios, dtype=np.float64)
+
     # 验证比例之和是否为1 (使用 math.isclose 处理浮点数精度问题)
-    total_ratio = sum(ratios)
+    total_ratio = ratios.sum()
     if not math.isclose(total_ratio, 1.0, rel_tol=1e-9):
         raise ValueError(f"Ratios must sum to 1, but got {total_ratio}")
 
@@ -42,24 +55,29 @@ def draw_rectangles_by_ratio(ratios, labels=None, image_size=6, dpi=100):
     # 为每个比例生成颜色
     colors = generate_colors(len(ratios))
 
-    # 绘制矩形
-    for i, (rect, color, label) in enumerate(zip(rectangles, colors, labels)):
-        ratio = ratios[i]
-        if ratio <= 0:
-            continue
-
-        x, y, width, height = rect
-
-        # 绘制矩形
-        rectangle = patches.Rectangle((x, y), width, height,
-                                      linewidth=1, edgecolor='black', facecolor=color)
-        ax.add_patch(rectangle)
-
-        # 在矩形中心添加标识文本
-        ax.text(x + width / 2, y + height / 2,
-                label, ha='center', va='center', fontsize=8,
-                color='white' if is_dark_color(color) else 'black',
-                weight='bold')
+    # 一次性计算所有颜色的亮度，判断是否为深色
+    dark_mask = colors.dot(_LUMA_WEIGHTS) < 0.5
+
+    # 只绘制比例大于0的矩形
+    visible = ratios > 0
+    rects = np.asarray(rectangles, dtype=np.float64).reshape(-1, 4)[visible]
+    colors = colors[visible]
+    dark_mask = dark_mask[visible]
+    labels = [label for label, keep in zip(labels, visible) if keep]
+
+    # 将所有矩形合并为一个集合，一次性添加到坐标轴
+    rectangle_collection = PatchCollection(
+        [patches.Rectangle((x, y), width, height) for x, y, width, height in rects],
+        facecolors=colors, edgecolors='black', linewidths=1)
+    ax.add_collection(rectangle_collection)
+
+    # 在矩形中心添加标识文本
+    centers_x = rects[:, 0] + rects[:, 2] / 2
+    centers_y = rects[:, 1] + rects[:, 3] / 2
+    fontdict = {'fontsize': 8, 'weight': 'bold'}
+    for cx, cy, label, dark in zip(centers_x, centers_y, labels, dark_mask):
+        ax.text(cx, cy, label, fontdict=fontdict, ha='center', va='center',
+                color='white' if dark else 'black')
 
     # 设置坐标轴属性
     ax.set_xlim(0, 1)
@@ -76,7 +94,7 @@ def draw_rectangles_by_ratio(ratios, labels=None, image_size=6, dpi=100):
     # 显示图形
     plt.show()
 
-    return fig, ax
+    return fig, ax, rectangles
 
 
 def layout_rectangles_exact(ratios):
@@ -89,72 +107,106 @@ def layout_rectangles_exact(ratios):
     2. 构建一个二叉树，每个节点代表一个矩形区域
     3. 优先将大比例矩形放在左侧
     """
+    ratios = np.asarray(ratios, dtype=np.float64)
+
+    # 按比例从大到小排序索引（稳定排序，比例相同时保持原有顺序）
+    sorted_idx = np.argsort(-ratios, kind='stable')
+    # 前缀和：prefix[i] 为排序后前 i 个比例之和
+    prefix = np.concatenate([[0.0], np.cumsum(ratios[sorted_idx])])
+
+    # 计算排序后每个矩形的位置；规模很大时使用numba编译后的同一算法
+    layout = _get_numba_layout() if len(ratios) >= _NUMBA_MIN_SIZE else None
+    if layout is not None:
+        sorted_rects = layout(prefix)
+    else:
+        sorted_rects = _layout_sorted(prefix.tolist())
+
+    # 还原为原始顺序
     rectangles = [None] * len(ratios)
+    for i, rect in zip(sorted_idx.tolist(), sorted_rects):
+        rectangles[i] = rect
+    return rectangles
 
-    def split_area(x, y, width, height, indices):
-        """
-        递归分割区域
 
-        参数:
-        x, y: 当前区域的左下角坐标
-        width, height: 当前区域的宽度和高度
-        indices: 需要分配到这个区域的矩形索引列表（已按比例排序）
-        """
-        if len(indices) == 1:
-            # 只剩一个矩形，直接分配整个区域
-            rectangles[indices[0]] = (x, y, width, height)
-            return
-
-        # 将索引列表分为两部分
-        # 为了保持大矩形在左侧，我们按累积比例分割
-        total = sum(ratios[i] for i in indices)
-        target = total / 2
-        cumulative = 0
-        split_point = 1  # 至少左边要有1个元素
-
-        # 寻找最佳分割点，使左侧比例尽可能接近总比例的一半
-        for i in range(len(indices) - 1):  # 不包括最后一个，确保右边至少有1个元素
-            cumulative += ratios[indices[i]]
-            if cumulative >= target:
-                # 检查当前分割点和下一个分割点哪个更接近目标
-                if i + 1 < len(indices) - 1:
-                    next_cumulative = cumulative + ratios[indices[i + 1]]
-                    if abs(cumulative - target) <= abs(next_cumulative - target):
-                        split_point = i + 1
-                        break
-                split_point = i + 1
-                break
-        else:
-            # 如果循环完成仍未break，则取最后一个可能的分割点
-            split_point = len(indices) - 1
+def _layout_sorted(prefix):
+    """
+    使用显式栈迭代分割区域
+
+    既可直接以Python列表运行，也可由numba编译后以numpy数组运行
+
+    参数:
+    prefix: 按比例从大到小排序后的前缀和，长度为 n + 1
 
-        left_indices = indices[:split_point]
-        right_indices = indices[split_point:]
+    返回:
+    按排序后的顺序排列的 (x, y, width, height) 列表
+    """
+    n = len(prefix) - 1
+    rects = [(0.0, 0.0, 0.0, 0.0)] * n
+    if n == 0:
+        return rects
+
+    # 栈中每一项为一个待分割的区域：(lo, hi, x, y, width, height)
+    # 其中 [lo, hi) 为分配到该区域的矩形在排序后的区间
+    stack = [(0, n, 0.0, 0.0, 1.0, 1.0)]
+    while stack:
+        lo, hi, x, y, width, height = stack.pop()
+
+        if hi - lo == 1:
+            # 只剩一个矩形，直接分配整个区域
+            rects[lo] = (x, y, width, height)
+            continue
 
-        left_ratio = sum(ratios[i] for i in left_indices)
-        right_ratio = sum(ratios[i] for i in right_indices)
+        # 将区间分为两部分
+        # 为了保持大矩形在左侧，我们按累积比例分割：
+        # 取左侧累积比例首次达到总比例一半的位置，且左右两侧至少各有1个元素
+        # （即在 prefix[lo + 1:hi - 1] 中二分查找，找不到时取 hi - 1）
+        goal = prefix[lo] + (prefix[hi] - prefix[lo]) / 2
+        left, right = lo + 1, hi - 1
+        while left < right:
+            mid = (left + right) // 2
+            if prefix[mid] < goal:
+                left = mid + 1
+            else:
+                right = mid
+        split = left
+
+        left_ratio = prefix[split] - prefix[lo]
+        right_ratio = prefix[hi] - prefix[split]
 
         # 优先垂直分割（左右分割）以保持大矩形在左侧
         # 只有当高度远大于宽度时才考虑水平分割
         if width >= height * 0.7:  # 调整阈值以优先垂直分割
             # 垂直分割
             left_width = width * left_ratio / (left_ratio + right_ratio)
-            split_area(x, y, left_width, height, left_indices)
-            split_area(x + left_width, y, width - left_width, height, right_indices)
+            stack.append((lo, split, x, y, left_width, height))
+            stack.append((split, hi, x + left_width, y, width - left_width, height))
         else:
             # 水平分割
             bottom_height = height * left_ratio / (left_ratio + right_ratio)
-            split_area(x, y, width, bottom_height, left_indices)
-            split_area(x, y + bottom_height, width, height - bottom_height, right_indices)
+            stack.append((lo, split, x, y, width, bottom_height))
+            stack.append((split, hi, x, y + bottom_height, width, height - bottom_height))
 
-    # 按比例从大到小排序索引
-    indices = list(range(len(ratios)))
-    indices.sort(key=lambda i: ratios[i], reverse=True)
+    return rects
 
-    # 初始调用
-    split_area(0, 0, 1, 1, indices)
 
-    return rectangles
+_numba_layout = None
+
+
+def _get_numba_layout():
+    """
+    按需导入numba并编译 _layout_sorted（numba为可选依赖）
+
+    返回:
+    编译后的函数；未安装numba时返回None
+    """
+    global _numba_layout
+    if _numba_layout is None:
+        try:
+            from numba import njit
+        except ImportError:
+            return None
+        _numba_layout = njit(cache=True)(_layout_sorted)
+    return _numba_layout
 
 
 def generate_colors(n):
@@ -165,20 +217,44 @@ def generate_colors(n):
     n: 需要生成的颜色数量
 
     返回:
-    包含n个颜色的列表
+    包含n个颜色的数组，形状为 (n, 3)
     """
-    colors = []
-    for i in range(n):
-        # 使用HSV色彩空间生成均匀分布的颜色
-        hue = i / n
-        saturation = 0.3 + random.random() * 0.2  # 0.7-1.0的饱和度
-        value = 0.6 + random.random() * 0.4  # 0.6-1.0的明度
-        rgb = hsv_to_rgb([hue, saturation, value])
-        colors.append(rgb)
+    # 使用HSV色彩空间生成均匀分布的颜色
+    hues = np.arange(n) / n
+    sv = _RNG.random((n, 2))
+    saturation = 0.3 + 0.2 * sv[:, 0]  # 0.3-0.5的饱和度
+    value = 0.6 + 0.4 * sv[:, 1]  # 0.6-1.0的明度
+    hsv = np.stack([hues, saturation, value], axis=1)
+    colors = _hsv_to_rgb_vec(hsv)
 
     # 随机打乱颜色顺序，使颜色分布更自然
-    random.shuffle(colors)
-    return colors
+    return colors[_RNG.permutation(n)]
+
+
+def _hsv_to_rgb_vec(hsv):
+    """
+    将HSV颜色数组批量转换为RGB颜色数组
+
+    参数:
+    hsv: 形状为 (n, 3) 的数组，每行为 (色相, 饱和度, 明度)，取值范围均为 [0, 1]
+
+    返回:
+    形状为 (n, 3) 的RGB颜色数组
+    """
+    h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+    c = v * s
+    hp = (h % 1.0) * 6
+    x = c * (1 - np.abs(hp % 2 - 1))
+    m = v - c
+    zero = np.zeros_like(c)
+
+    # 按色相所在的六个区间分别确定 (r, g, b) 的取值
+    sector = hp.astype(np.int64)
+    conditions = [sector == k for k in range(6)]
+    r = np.select(conditions, [c, x, zero, zero, x, c])
+    g = np.select(conditions, [x, c, c, x, zero, zero])
+    b = np.select(conditions, [zero, zero, x, c, c, x])
+    return np.stack([r + m, g + m, b + m], axis=1)
 
 
 def is_dark_color(color):
@@ -237,25 +313,25 @@ def example_usage():
     # 绘制矩形
     print("Drawing rectangles with ratios:", ratios)
     print("And labels:", labels)
-    draw_rectangles_by_ratio(ratios, labels)
+    _, _, rectangles = draw_rectangles_by_ratio(ratios, labels)
 
     # 验证矩形是否完全填满正方形
-    rectangles = layout_rectangles_exact(ratios)
     total_area = sum(rect[2] * rect[3] for rect in rectangles)
     print(f"Total area of all rectangles: {total_area:.6f} (should be 1.000000)")
 
     # 检查是否有重叠或间隙
     print("Verifying rectangle layout...")
-    for i, rect1 in enumerate(rectangles):
-        x1, y1, w1, h1 = rect1
-        for j, rect2 in enumerate(rectangles):
-            if i >= j:
-                continue
-            x2, y2, w2, h2 = rect2
-            # 检查是否重叠
-            if (x1 < x2 + w2 and x1 + w1 > x2 and
-                    y1 < y2 + h2 and y1 + h1 > y2):
-                print(f"Warning: Rectangles {i} and {j} overlap!")
+    rects = np.array(rectangles)
+    x, y, w, h = rects[:, 0:1], rects[:, 1:2], rects[:, 2:3], rects[:, 3:4]
+    # 利用广播一次性计算所有矩形对在x、y方向上是否相交
+    # （边界相接时允许极小的浮点误差，不视为重叠）
+    tol = 1e-9
+    overlap_x = (x < x.T + w.T - tol) & (x + w - tol > x.T)
+    overlap_y = (y < y.T + h.T - tol) & (y + h - tol > y.T)
+    # 只保留上三角部分（i < j），避免重复比较和自身比较
+    overlap = overlap_x & overlap_y & np.triu(np.ones_like(overlap_x, dtype=bool), k=1)
+    for i, j in np.argwhere(overlap):
+        print(f"Warning: Rectangles {i} and {j} overlap!")
 
     print("Verification complete.")
 
@@ -2,9 +2,28 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.patches import Circle
+from matplotlib.collections import PatchCollection
 import os
+import hashlib
 import matplotlib.font_manager as fm
-import random
+
+try:
+    from pyarrow import ArrowException
+except ImportError:
+    ArrowException = OSError  # 未安装pyarrow时不会产生该类错误
+
+# 生成随机颜色使用的随机数生成器
+_RNG = np.random.default_rng()
+
+# 读取Excel时使用的参数；parquet缓存文件名包含这些参数的摘要，修改参数后旧缓存自动失效
+_EXCEL_READ_OPTIONS = {
+    'engine': 'openpyxl',
+    'header': 0,
+    'names': ['干预措施', '具体名称（中医药)', '中医证型'],
+}
+
+# 读写parquet缓存时可能出现的错误：文件读写失败、文件损坏或数据无法转换
+_CACHE_ERRORS = (OSError, ArrowException)
 
 
 def read_excel_data(file_path):
@@ -20,14 +39,37 @@ def read_excel_data(file_path):
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"文件 {file_path} 不存在")
     
-    # 读取Excel文件
-    df = pd.read_excel(file_path, header=None)
-    
-    # 设置列名
-    df.columns = ['干预措施', '具体名称（中医药)', '中医证型']
-    
-    # 删除第一行（原来的列名）
-    df = df.drop(0).reset_index(drop=True)
+    # 如果存在比Excel文件更新的parquet缓存，直接读取缓存
+    df = None
+    options_digest = hashlib.sha1(repr(_EXCEL_READ_OPTIONS).encode('utf-8')).hexdigest()[:8]
+    cache_path = f'{file_path}.{options_digest}.parquet'
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+        try:
+            df = pd.read_parquet(cache_path)
+        except ImportError:
+            pass  # 未安装parquet引擎，不使用缓存
+        except _CACHE_ERRORS as e:
+            print(f"读取缓存 {cache_path} 失败，改为读取Excel文件: {e}")
+    
+    if df is None:
+        # 读取Excel文件，用指定的列名替换第一行（原来的列名）
+        df = pd.read_excel(file_path, **_EXCEL_READ_OPTIONS)
+        
+        # 保存parquet缓存，加快下次读取；缓存只是优化，写入失败时跳过缓存
+        try:
+            df.to_parquet(cache_path)
+        except ImportError:
+            pass  # 未安装parquet引擎，不使用缓存
+        except _CACHE_ERRORS as e:
+            print(f"写入缓存 {cache_path} 失败，跳过缓存: {e}")
+            if os.path.exists(cache_path):
+                try:
+                    os.remove(cache_path)  # 删除写了一半的缓存文件
+                except OSError:
+                    pass
+    
+    # 各列取值重复较多，转换为 Categorical 类型以加快筛选和分组
+    df = df.astype('category')
     
     return df
 
@@ -55,15 +97,19 @@ def count_combinations(df):
     df: 筛选后的DataFrame
     
     返回:
-    dict: {(证型, 药品名称): 数量} 的字典
+    DataFrame: 每行一个组合，包含 '中医证型'、'具体名称（中医药)'、'count'（数量）、
+    'pattern_idx'（证型在排序后证型列表中的位置）和 'drug_idx'（药品在排序后药品列表中的位置）列，
+    其中证型和药品名称列为按名称排序的 Categorical 类型
     """
-    combinations = {}
+    counts = df.groupby(['中医证型', '具体名称（中医药)'], observed=True).size().reset_index(name='count')
     
-    for _, row in df.iterrows():
-        pattern_drug = (row['中医证型'], row['具体名称（中医药)'])
-        combinations[pattern_drug] = combinations.get(pattern_drug, 0) + 1
+    # 为证型和药品名称分别编号（类别已按名称排序），作为绘图时的坐标
+    counts['中医证型'] = counts['中医证型'].cat.remove_unused_categories()
+    counts['具体名称（中医药)'] = counts['具体名称（中医药)'].cat.remove_unused_categories()
+    counts['pattern_idx'] = counts['中医证型'].cat.codes
+    counts['drug_idx'] = counts['具体名称（中医药)'].cat.codes
     
-    return combinations
+    return counts
 
 
 def generate_random_colors(n):
@@ -74,14 +120,9 @@ def generate_random_colors(n):
     n: 需要生成的颜色数量
     
     返回:
-    list: 包含n个颜色的列表
+    ndarray: 形状为 (n, 3) 的RGB颜色数组
     """
-    colors = []
-    for _ in range(n):
-        # 生成随机RGB颜色
-        color = (random.random(), random.random(), random.random())
-        colors.append(color)
-    return colors
+    return _RNG.random((n, 3))
 
 
 def draw_association_chart(combinations, treatment_type):
@@ -89,7 +130,7 @@ def draw_association_chart(combinations, treatment_type):
     绘制关联图
     
     参数:
-    combinations: {(证型, 药品名称): 数量} 的字典
+    combinations: count_combinations 返回的组合统计DataFrame
     treatment_type: 干预措施类型
     """
     # 设置中文字体支持
@@ -97,8 +138,13 @@ def draw_association_chart(combinations, treatment_type):
     plt.rcParams['axes.unicode_minus'] = False  # 解决负号'-'显示为方块的问题
     
     # 获取所有唯一的证型和药品名称
-    patterns = sorted(list(set([item[0] for item in combinations.keys()])))
-    drugs = sorted(list(set([item[1] for item in combinations.keys()])))
+    patterns = list(combinations['中医证型'].cat.categories)
+    drugs = list(combinations['具体名称（中医药)'].cat.categories)
+    
+    # 每个组合在坐标轴上的位置：x轴为药品名称，y轴为证型
+    xs = combinations['drug_idx'].to_numpy()
+    ys = combinations['pattern_idx'].to_numpy()
+    counts = combinations['count'].to_numpy()
     
     # 根据数据量动态调整图形大小，确保所有内容都能完整显示
     # 纵轴项越多，图形高度越高；横轴项越多，图形宽度越宽
@@ -127,41 +173,28 @@ def draw_association_chart(combinations, treatment_type):
     ax.set_yticklabels(patterns, fontsize=10)  # 纵轴显示证型
     
     # 为每个组合生成随机颜色
-    unique_combinations = list(combinations.keys())
-    colors = generate_random_colors(len(unique_combinations))
-    color_map = dict(zip(unique_combinations, colors))
+    colors = generate_random_colors(len(combinations))
     
     # 绘制空心圆，增加半径范围，使圆可以跨越网格线
-    max_count = max(combinations.values()) if combinations else 1
-    min_count = min(combinations.values()) if combinations else 1
+    max_count = counts.max() if len(counts) else 1
+    min_count = counts.min() if len(counts) else 1
     
-    # 如果最大值和最小值相同，则所有圆使用相同大小
+    # 根据数量确定圆的大小，使用更大幅度的半径变化
     if max_count == min_count:
-        radius_factor = 0.4  # 增大固定半径
+        # 如果最大值和最小值相同，则所有圆使用相同大小
+        radii = np.full(len(counts), 0.4)  # 增大固定半径
     else:
-        # 计算半径缩放因子，使差异更明显
-        radius_factor = 0.7 / (max_count - min_count)
+        # 使用平方函数来放大差异，使大数量的圆更大
+        normalized_counts = (counts - min_count) / (max_count - min_count)
+        radii = 0.15 + 0.6 * normalized_counts ** 1.5
     
-    for (pattern, drug), count in combinations.items():
-        x = drugs.index(drug)  # x轴为药品名称
-        y = patterns.index(pattern)  # y轴为证型
-        
-        # 根据数量确定圆的大小，使用更大幅度的半径变化
-        if max_count == min_count:
-            radius = radius_factor
-        else:
-            # 使用平方函数来放大差异，使大数量的圆更大
-            normalized_count = (count - min_count) / (max_count - min_count)
-            radius = 0.15 + 0.6 * (normalized_count ** 1.5)
-        
-        # 获取颜色
-        color = color_map[(pattern, drug)]
-        
-        # 绘制空心圆
-        circle = Circle((x, y), radius, fill=False, edgecolor=color, linewidth=2)
-        ax.add_patch(circle)
-        
-        # 在圆心添加数量标签
+    # 将所有空心圆合并为一个集合，一次性添加到坐标轴
+    circles = [Circle((x, y), radius) for x, y, radius in zip(xs, ys, radii)]
+    circle_collection = PatchCollection(circles, facecolors='none', edgecolors=colors, linewidths=2)
+    ax.add_collection(circle_collection)
+    
+    # 在圆心添加数量标签
+    for x, y, count in zip(xs, ys, counts):
         ax.text(x, y, str(count), ha='center', va='center', fontsize=9, color='black')
     
     # # 设置标题
@@ -200,7 +233,7 @@ def main(treatment_type='中成药'):
         print(f"共有 {len(combinations)} 种组合")
         
         # 绘制关联图
-        if combinations:
+        if not combinations.empty:
             draw_association_chart(combinations, treatment_type)
         else:
             print(f"没有找到 {treatment_type} 的数据")